@@ -2,14 +2,34 @@
 Person CRUD API endpoints.
 """
 import logging
+from collections import deque
+
 from fastapi import APIRouter, HTTPException, Request, Response
 
-from models import Person, PersonCreate, PersonUpdate, PositionUpdate
+from models import Person, PersonCreate, PersonUpdate, PositionUpdate, PositionBatchItem
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/persons", tags=["persons"])
 
+# Free-list of scratch lists reused across delete requests to avoid
+# allocating (and GC-ing) a fresh temporary list per call
+_scratch_pool: deque = deque(maxlen=32)
+
+
+def _get_scratch() -> list:
+    """Pop a reusable scratch list from the pool, or make a new one."""
+    try:
+        return _scratch_pool.pop()
+    except IndexError:
+        return []
+
+
+def _release_scratch(lst: list):
+    """Clear a scratch list and return it to the pool."""
+    lst.clear()
+    _scratch_pool.append(lst)
+
 # Session management functions (set by main.py)
 session_manager = None
 get_session_from_request = None
@@ -36,9 +56,12 @@ async def create_person(person_data: PersonCreate, request: Request, response: R
     """Create a new person."""
     tree_state = get_tree_state(request, response)
     
-    person = Person(**person_data.model_dump())
-    tree_state.save_state("create_person")
-    tree_state.tree.persons[person.id] = person
+    # FastAPI already validated person_data, so skip a second validation pass
+    person = Person.fast(**person_data.__dict__)
+    async with tree_state.lock:
+        tree_state.save_state("create_person")
+        tree_state.tree.persons[person.id] = person
+        tree_state.bump()
     logger.info("Created person: %s", person.id)
     return person
 
@@ -58,7 +81,15 @@ async def get_person(person_id: str, request: Request, response: Response):
 async def list_persons(request: Request, response: Response):
     """List all persons."""
     tree_state = get_tree_state(request, response)
-    return list(tree_state.tree.persons.values())
+    # Encode the field dicts directly; these are our own already-valid
+    # models, so the model_dump walk adds nothing but CPU
+    body = tree_state.list_json_bytes(
+        "persons",
+        lambda: [p.__dict__ for p in tree_state.tree.persons.values()]
+    )
+    # Carry the session cookie over; raw Responses skip the header merge
+    return Response(content=body, media_type="application/json",
+                    headers=dict(response.headers))
 
 
 @router.put("/{person_id}", response_model=Person)
@@ -66,17 +97,18 @@ async def update_person(person_id: str, person_data: PersonUpdate, request: Requ
     """Update a person."""
     tree_state = get_tree_state(request, response)
     
-    if person_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    tree_state.save_state("update_person")
-    person = tree_state.tree.persons[person_id]
     update_data = person_data.model_dump(exclude_unset=True)
-    
-    for field, value in update_data.items():
-        setattr(person, field, value)
-    
-    tree_state.tree.persons[person_id] = person
+    async with tree_state.lock:
+        if person_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Person not found")
+
+        tree_state.save_state("update_person")
+        person = tree_state.tree.persons[person_id]
+
+        for field, value in update_data.items():
+            setattr(person, field, value)
+
+        tree_state.bump()
     logger.info("Updated person: %s", person_id)
     return person
 
@@ -86,36 +118,38 @@ async def update_position(person_id: str, position: PositionUpdate, request: Req
     """Update just the position of a person."""
     tree_state = get_tree_state(request, response)
     
-    if person_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    # Don't save state for position updates (would be too many)
-    person = tree_state.tree.persons[person_id]
-    person.x = position.x
-    person.y = position.y
-    tree_state.tree.persons[person_id] = person
-    
-    tree_state.force_save()
-    
+    async with tree_state.lock:
+        if person_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Person not found")
+
+        # Don't save state for position updates (would be too many)
+        person = tree_state.tree.persons[person_id]
+        person.x = position.x
+        person.y = position.y
+
+        tree_state.mark_dirty()
+
     return person
 
 
 @router.patch("/positions", response_model=dict)
-async def update_positions(positions: list[dict], request: Request, response: Response):
+async def update_positions(positions: list[PositionBatchItem], request: Request, response: Response):
     """Update positions for multiple persons."""
     tree_state = get_tree_state(request, response)
-    
+
     count = 0
-    for pos in positions:
-        person_id = pos.get('id')
-        if person_id in tree_state.tree.persons:
-            person = tree_state.tree.persons[person_id]
-            person.x = pos.get('x')
-            person.y = pos.get('y')
+    async with tree_state.lock:
+        persons = tree_state.tree.persons
+        for pos in positions:
+            person = persons.get(pos.id)
+            if person is None:
+                continue
+            person.x = pos.x
+            person.y = pos.y
             count += 1
-            
-    if count > 0:
-        tree_state.force_save()
+
+        if count > 0:
+            tree_state.mark_dirty()
             
     return {"status": "success", "updated_count": count}
 
@@ -125,27 +159,26 @@ async def delete_person(person_id: str, request: Request, response: Response):
     """Delete a person and all their relationships."""
     tree_state = get_tree_state(request, response)
     
-    if person_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Person not found")
-    
-    tree_state.save_state("delete_person")
-    
-    # Remove person
-    del tree_state.tree.persons[person_id]
-    
-    # Remove marriages involving this person
-    marriages_to_remove = [
-        m_id for m_id, m in tree_state.tree.marriages.items()
-        if m.spouse1_id == person_id or m.spouse2_id == person_id
-    ]
-    for m_id in marriages_to_remove:
-        del tree_state.tree.marriages[m_id]
-    
-    # Remove parent-child relationships
-    tree_state.tree.parent_child = [
-        pc for pc in tree_state.tree.parent_child
-        if pc.parent_id != person_id and pc.child_id != person_id
-    ]
-    
+    async with tree_state.lock:
+        if person_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Person not found")
+
+        tree_state.save_state("delete_person")
+
+        # Remove person
+        del tree_state.tree.persons[person_id]
+
+        # Remove marriages involving this person (O(degree) via the index)
+        marriages_to_remove = _get_scratch()
+        marriages_to_remove.extend(tree_state.tree.marriage_ids_of(person_id))
+        for m_id in marriages_to_remove:
+            tree_state.tree.remove_marriage(m_id)
+        _release_scratch(marriages_to_remove)
+
+        # Remove parent-child relationships
+        tree_state.tree.remove_person_relations(person_id)
+
+        tree_state.bump()
+
     logger.info("Deleted person: %s", person_id)
     return {"status": "deleted", "id": person_id}
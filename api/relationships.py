@@ -36,29 +36,31 @@ async def create_marriage(marriage_data: MarriageCreate, request: Request, respo
     """Create a new marriage between two persons."""
     tree_state = get_tree_state(request, response)
     
-    # Validate persons exist
-    if marriage_data.spouse1_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Spouse 1 not found")
-    if marriage_data.spouse2_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Spouse 2 not found")
-    
-    # Calculate order for this marriage
-    existing_marriages = [
-        m for m in tree_state.tree.marriages.values()
-        if m.spouse1_id in [marriage_data.spouse1_id, marriage_data.spouse2_id]
-        or m.spouse2_id in [marriage_data.spouse1_id, marriage_data.spouse2_id]
-    ]
-    order = len(existing_marriages) + 1
-    
-    tree_state.save_state("create_marriage")
-    
-    marriage = Marriage(
-        spouse1_id=marriage_data.spouse1_id,
-        spouse2_id=marriage_data.spouse2_id,
-        marriage_date=marriage_data.marriage_date,
-        order=order
-    )
-    tree_state.tree.marriages[marriage.id] = marriage
+    async with tree_state.lock:
+        # Validate persons exist
+        if marriage_data.spouse1_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Spouse 1 not found")
+        if marriage_data.spouse2_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Spouse 2 not found")
+
+        # Calculate order for this marriage from the spouse index
+        existing = (
+            tree_state.tree.marriage_ids_of(marriage_data.spouse1_id)
+            | tree_state.tree.marriage_ids_of(marriage_data.spouse2_id)
+        )
+        order = len(existing) + 1
+
+        tree_state.save_state("create_marriage")
+
+        # Fields come from a validated request model plus our own counter
+        marriage = Marriage.fast(
+            spouse1_id=marriage_data.spouse1_id,
+            spouse2_id=marriage_data.spouse2_id,
+            marriage_date=marriage_data.marriage_date,
+            order=order
+        )
+        tree_state.tree.add_marriage(marriage)
+        tree_state.bump()
     logger.info("Created marriage: %s", marriage.id)
     return marriage
 
@@ -67,7 +69,13 @@ async def create_marriage(marriage_data: MarriageCreate, request: Request, respo
 async def list_marriages(request: Request, response: Response):
     """List all marriages."""
     tree_state = get_tree_state(request, response)
-    return list(tree_state.tree.marriages.values())
+    body = tree_state.list_json_bytes(
+        "marriages",
+        lambda: [m.__dict__ for m in tree_state.tree.marriages.values()]
+    )
+    # Carry the session cookie over; raw Responses skip the header merge
+    return Response(content=body, media_type="application/json",
+                    headers=dict(response.headers))
 
 
 @router.put("/marriages/{marriage_id}", response_model=Marriage)
@@ -75,17 +83,19 @@ async def update_marriage(marriage_id: str, data: dict, request: Request, respon
     """Update marriage details."""
     tree_state = get_tree_state(request, response)
     
-    if marriage_id not in tree_state.tree.marriages:
-        raise HTTPException(status_code=404, detail="Marriage not found")
-    
-    tree_state.save_state("update_marriage")
-    
-    marriage = tree_state.tree.marriages[marriage_id]
-    
-    # Update allowed fields
-    if "marriage_date" in data:
-        marriage.marriage_date = data["marriage_date"]
-    
+    async with tree_state.lock:
+        if marriage_id not in tree_state.tree.marriages:
+            raise HTTPException(status_code=404, detail="Marriage not found")
+
+        tree_state.save_state("update_marriage")
+
+        marriage = tree_state.tree.marriages[marriage_id]
+
+        # Update allowed fields
+        if "marriage_date" in data:
+            marriage.marriage_date = data["marriage_date"]
+            tree_state.bump()
+
     logger.info("Updated marriage: %s", marriage_id)
     return marriage
 
@@ -95,20 +105,20 @@ async def delete_marriage(marriage_id: str, request: Request, response: Response
     """Delete a marriage."""
     tree_state = get_tree_state(request, response)
     
-    if marriage_id not in tree_state.tree.marriages:
-        raise HTTPException(status_code=404, detail="Marriage not found")
-    
-    tree_state.save_state("delete_marriage")
-    
-    # Remove marriage
-    del tree_state.tree.marriages[marriage_id]
-    
-    # Remove parent-child relationships linked to this marriage
-    tree_state.tree.parent_child = [
-        pc for pc in tree_state.tree.parent_child
-        if pc.marriage_id != marriage_id
-    ]
-    
+    async with tree_state.lock:
+        if marriage_id not in tree_state.tree.marriages:
+            raise HTTPException(status_code=404, detail="Marriage not found")
+
+        tree_state.save_state("delete_marriage")
+
+        # Remove marriage
+        tree_state.tree.remove_marriage(marriage_id)
+
+        # Remove parent-child relationships linked to this marriage
+        tree_state.tree.remove_marriage_relations(marriage_id)
+
+        tree_state.bump()
+
     logger.info("Deleted marriage: %s", marriage_id)
     return {"status": "deleted", "id": marriage_id}
 
@@ -118,30 +128,28 @@ async def add_child(relation: ParentChildCreate, request: Request, response: Res
     """Add a child to a parent (optionally linked to a marriage)."""
     tree_state = get_tree_state(request, response)
     
-    # Validate persons exist
-    if relation.parent_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Parent not found")
-    if relation.child_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Child not found")
-    if relation.marriage_id and relation.marriage_id not in tree_state.tree.marriages:
-        raise HTTPException(status_code=404, detail="Marriage not found")
-    
-    # Check for existing relationship
-    existing = [
-        pc for pc in tree_state.tree.parent_child
-        if pc.parent_id == relation.parent_id and pc.child_id == relation.child_id
-    ]
-    if existing:
-        raise HTTPException(status_code=400, detail="Relationship already exists")
-    
-    tree_state.save_state("add_child")
-    
-    parent_child = ParentChild(
-        parent_id=relation.parent_id,
-        child_id=relation.child_id,
-        marriage_id=relation.marriage_id
-    )
-    tree_state.tree.parent_child.append(parent_child)
+    async with tree_state.lock:
+        # Validate persons exist
+        if relation.parent_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Parent not found")
+        if relation.child_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Child not found")
+        if relation.marriage_id and relation.marriage_id not in tree_state.tree.marriages:
+            raise HTTPException(status_code=404, detail="Marriage not found")
+
+        # Check for existing relationship
+        if tree_state.tree.has_parent_child(relation.parent_id, relation.child_id):
+            raise HTTPException(status_code=400, detail="Relationship already exists")
+
+        tree_state.save_state("add_child")
+
+        parent_child = ParentChild.fast(
+            parent_id=relation.parent_id,
+            child_id=relation.child_id,
+            marriage_id=relation.marriage_id
+        )
+        tree_state.tree.add_parent_child(parent_child)
+        tree_state.bump()
     logger.info("Added child relation: %s -> %s", relation.parent_id, relation.child_id)
     return parent_child
 
@@ -150,7 +158,13 @@ async def add_child(relation: ParentChildCreate, request: Request, response: Res
 async def list_parent_child(request: Request, response: Response):
     """List all parent-child relationships."""
     tree_state = get_tree_state(request, response)
-    return tree_state.tree.parent_child
+    body = tree_state.list_json_bytes(
+        "parent_child",
+        lambda: [pc.__dict__ for pc in tree_state.tree.parent_child.values()]
+    )
+    # Carry the session cookie over; raw Responses skip the header merge
+    return Response(content=body, media_type="application/json",
+                    headers=dict(response.headers))
 
 
 @router.delete("/children/{parent_id}/{child_id}")
@@ -158,17 +172,13 @@ async def remove_child(parent_id: str, child_id: str, request: Request, response
     """Remove a parent-child relationship."""
     tree_state = get_tree_state(request, response)
     
-    original_len = len(tree_state.tree.parent_child)
-    
-    tree_state.save_state("remove_child")
-    
-    tree_state.tree.parent_child = [
-        pc for pc in tree_state.tree.parent_child
-        if not (pc.parent_id == parent_id and pc.child_id == child_id)
-    ]
-    
-    if len(tree_state.tree.parent_child) == original_len:
-        raise HTTPException(status_code=404, detail="Relationship not found")
+    async with tree_state.lock:
+        tree_state.save_state("remove_child")
+
+        if tree_state.tree.remove_parent_child(parent_id, child_id) is None:
+            raise HTTPException(status_code=404, detail="Relationship not found")
+
+        tree_state.bump()
     
     logger.info("Removed child relation: %s -> %s", parent_id, child_id)
     return {"status": "deleted", "parent_id": parent_id, "child_id": child_id}
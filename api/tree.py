@@ -1,19 +1,33 @@
 """
 Tree operations API endpoints (undo/redo, export, layout, JSON import/export).
 """
+import asyncio
+import itertools
 import json
 import logging
+import mimetypes
 import os
-import base64
-from datetime import datetime
+import time
 from pathlib import Path
 from typing import Optional
-from copy import deepcopy
+
+import aiofiles
+import orjson
+
+try:
+    # SIMD-accelerated drop-in replacement; photos are multi-MB so the
+    # base64 encode/decode passes are worth the optional dependency
+    import pybase64 as base64
+except ImportError:
+    import base64
 
 from fastapi import APIRouter, HTTPException, UploadFile, File, Request, Response
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
 
-from models import FamilyTree, ExportOptions, LayoutOptions, Person
+from models import FamilyTree, Person, ExportOptions, LayoutOptions
+from services.export_service import export_tree as do_export
+from services.layout_service import calculate_layout
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +35,39 @@ router = APIRouter(prefix="/api/tree", tags=["tree"])
 
 UPLOADS_DIR = Path("uploads")
 
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB chunks keep upload memory bounded with few awaits
+
+# Photo mime maps shared by export-json (ext -> mime) and import-json
+# (mime -> ext) instead of being rebuilt for every photo
+_MIME_BY_EXT = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+}
+_EXT_BY_MIME = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+# Upload-name components: a date prefix refreshed at most once a minute
+# plus a per-process counter, so naming costs no strftime per request
+# and sub-second uploads cannot collide
+_upload_counter = itertools.count()
+_date_prefix = (0, "")
+
+
+def _fast_timestamp() -> str:
+    """Unique, roughly time-ordered tag for generated filenames."""
+    global _date_prefix
+    minute = int(time.time() // 60)
+    if _date_prefix[0] != minute:
+        _date_prefix = (minute, time.strftime("%Y%m%d_%H%M"))
+    return f"{_date_prefix[1]}_{os.getpid()}_{next(_upload_counter):06d}"
+
 # Session management functions (set by main.py)
 session_manager = None
 get_session_from_request = None
@@ -46,12 +93,33 @@ def get_tree_state(request: Request, response: Response):
 async def get_tree(request: Request, response: Response):
     """Get the entire family tree."""
     tree_state = get_tree_state(request, response)
-    
-    return {
-        "tree": tree_state.tree.model_dump(),
-        "can_undo": tree_state.can_undo(),
-        "can_redo": tree_state.can_redo()
-    }
+
+    # Polling clients get a body-less 304 until something changes; the
+    # ETag is nonce-salted per session (see TreeState.etag)
+    etag = tree_state.etag
+    if request.headers.get("if-none-match") == etag:
+        # The 304 must still echo the ETag and refresh the session
+        # cookie (raw Responses skip FastAPI's header merge)
+        return Response(
+            status_code=304,
+            headers={**dict(response.headers), "ETag": etag},
+        )
+
+    # The envelope shape is fixed, so splice the cached tree bytes into
+    # it directly: no pydantic walk and no encoder pass per GET
+    body = (
+        b'{"tree":' + tree_state.dump_json_bytes()
+        + b',"can_undo":' + (b"true" if tree_state.can_undo() else b"false")
+        + b',"can_redo":' + (b"true" if tree_state.can_redo() else b"false")
+        + b"}"
+    )
+    # Returning a raw Response bypasses FastAPI's header merge, so the
+    # session cookie set on the injected response must be carried over
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**dict(response.headers), "ETag": etag},
+    )
 
 
 @router.post("/new")
@@ -59,8 +127,10 @@ async def new_tree(request: Request, response: Response):
     """Create a new empty tree."""
     tree_state = get_tree_state(request, response)
     
-    tree_state.save_state("new_tree")
-    tree_state.tree = FamilyTree()
+    async with tree_state.lock:
+        tree_state.save_state("new_tree")
+        tree_state.tree = FamilyTree()
+        tree_state.bump()
     logger.info("Created new tree")
     return {"status": "created"}
 
@@ -70,8 +140,9 @@ async def undo(request: Request, response: Response):
     """Undo the last action."""
     tree_state = get_tree_state(request, response)
     
-    if not tree_state.undo():
-        raise HTTPException(status_code=400, detail="Nothing to undo")
+    async with tree_state.lock:
+        if not tree_state.undo():
+            raise HTTPException(status_code=400, detail="Nothing to undo")
     
     return {
         "status": "undone",
@@ -85,8 +156,9 @@ async def redo(request: Request, response: Response):
     """Redo the last undone action."""
     tree_state = get_tree_state(request, response)
     
-    if not tree_state.redo():
-        raise HTTPException(status_code=400, detail="Nothing to redo")
+    async with tree_state.lock:
+        if not tree_state.redo():
+            raise HTTPException(status_code=400, detail="Nothing to redo")
     
     return {
         "status": "redone",
@@ -99,11 +171,10 @@ async def redo(request: Request, response: Response):
 async def export_tree(options: ExportOptions, request: Request, response: Response):
     """Export the tree as an image or PDF."""
     tree_state = get_tree_state(request, response)
-    
-    from services.export_service import export_tree as do_export
-    
+
     try:
-        filepath = do_export(tree_state.tree, options)
+        # Rendering is CPU-bound (reportlab/PIL); keep it off the event loop
+        filepath = await asyncio.to_thread(do_export, tree_state.tree, options)
         return FileResponse(
             filepath,
             media_type="application/octet-stream",
@@ -118,21 +189,24 @@ async def export_tree(options: ExportOptions, request: Request, response: Respon
 async def auto_layout(options: LayoutOptions, request: Request, response: Response):
     """Auto-arrange the tree with the specified layout."""
     tree_state = get_tree_state(request, response)
-    
-    if options.root_person_id not in tree_state.tree.persons:
-        raise HTTPException(status_code=404, detail="Root person not found")
-    
-    from services.layout_service import calculate_layout
-    
-    tree_state.save_state("auto_layout")
-    
-    positions = calculate_layout(tree_state.tree, options)
-    
-    for person_id, pos in positions.items():
-        if person_id in tree_state.tree.persons:
-            tree_state.tree.persons[person_id].x = pos["x"]
-            tree_state.tree.persons[person_id].y = pos["y"]
-    
+
+    async with tree_state.lock:
+        if options.root_person_id not in tree_state.tree.persons:
+            raise HTTPException(status_code=404, detail="Root person not found")
+
+        tree_state.save_state("auto_layout")
+
+        positions = calculate_layout(tree_state.tree, options)
+
+        persons = tree_state.tree.persons
+        for person_id, pos in positions.items():
+            person = persons.get(person_id)
+            if person is not None:
+                person.x = pos["x"]
+                person.y = pos["y"]
+
+        tree_state.bump()
+
     logger.info("Applied auto-layout with root: %s", options.root_person_id)
     return {"status": "layout_applied", "positions": positions}
 
@@ -142,18 +216,20 @@ async def upload_photo(request: Request, response: Response, file: UploadFile =
     """Upload a photo file."""
     # Get session to ensure cookie is set
     get_tree_state(request, response)
-    
-    UPLOADS_DIR.mkdir(exist_ok=True)
-    
+
     # Generate unique filename
-    ext = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
-    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}"
+    if file.filename:
+        ext = os.path.splitext(file.filename)[1]
+    else:
+        ext = mimetypes.guess_extension(file.content_type or "") or ".jpg"
+    filename = f"{_fast_timestamp()}_{file.filename or 'photo' + ext}"
     filepath = UPLOADS_DIR / filename
-    
-    with open(filepath, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
+
+    # Stream to disk in chunks instead of buffering the whole photo in RAM
+    async with aiofiles.open(filepath, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await f.write(chunk)
+
     logger.info("Uploaded photo: %s", filepath)
     return {"status": "uploaded", "path": str(filepath), "filename": filename}
 
@@ -163,68 +239,114 @@ async def export_json(request: Request, response: Response):
     """Export tree as JSON with embedded base64 photos for client download."""
     tree_state = get_tree_state(request, response)
     
-    # Create a deep copy to embed photos
-    export_data = deepcopy(tree_state.tree.model_dump())
-    
-    # Embed photos as base64
-    for person_id, person in export_data["persons"].items():
-        if person.get("photo_path"):
-            photo_path = UPLOADS_DIR / os.path.basename(person["photo_path"])
-            if photo_path.exists():
-                try:
-                    with open(photo_path, "rb") as f:
-                        photo_data = f.read()
-                    # Detect mime type from extension
-                    ext = photo_path.suffix.lower()
-                    mime_types = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp"}
-                    mime = mime_types.get(ext, "image/jpeg")
-                    person["photo_base64"] = f"data:{mime};base64,{base64.b64encode(photo_data).decode('utf-8')}"
-                except Exception as e:
-                    logger.warning("Failed to embed photo %s: %s", photo_path, e)
-    
-    return JSONResponse(content=export_data)
+    # model_dump already builds a fresh dict graph, so mutating it to
+    # embed photos cannot touch the live tree; no extra copy needed
+    export_data = tree_state.tree.model_dump()
+
+    # Embed photos as base64, reading all referenced files concurrently
+    # rather than one blocking read at a time on the event loop
+    async def embed_photo(person: dict):
+        photo_path = UPLOADS_DIR / os.path.basename(person["photo_path"])
+        try:
+            async with aiofiles.open(photo_path, "rb") as f:
+                photo_data = await f.read()
+        except OSError as e:
+            logger.warning("Failed to embed photo %s: %s", photo_path, e)
+            return
+        # Detect mime type from extension
+        mime = _MIME_BY_EXT.get(photo_path.suffix.lower(), "image/jpeg")
+        # Concatenate as bytes and decode once as ASCII: base64 output
+        # never needs the UTF-8 scan an f-string interpolation pays
+        prefix = f"data:{mime};base64,".encode()
+        person["photo_base64"] = (prefix + base64.b64encode(photo_data)).decode("ascii")
+
+    tasks = [
+        embed_photo(person)
+        for person in export_data["persons"].values()
+        if person.get("photo_path")
+    ]
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    # Encode directly with orjson; jsonable_encoder would re-walk the
+    # whole dict (including multi-MB base64 strings) for nothing. The
+    # session cookie rides along since raw Responses skip the merge.
+    return Response(
+        content=orjson.dumps(export_data),
+        media_type="application/json",
+        headers=dict(response.headers),
+    )
 
 
 @router.post("/import-json")
-async def import_json(tree_data: FamilyTree, request: Request, response: Response):
+async def import_json(request: Request, response: Response):
     """Import tree from client-uploaded JSON, restoring base64 photos."""
     tree_state = get_tree_state(request, response)
-    
-    UPLOADS_DIR.mkdir(exist_ok=True)
-    
-    # Process base64 photos - save to disk and update photo_path
-    for person_id, person in tree_data.persons.items():
-        if person.photo_base64:
-            try:
-                # Parse data URL: data:image/jpeg;base64,/9j/4AAQ...
-                if person.photo_base64.startswith("data:"):
-                    header, data = person.photo_base64.split(",", 1)
-                    # Extract extension from mime type
-                    mime = header.split(";")[0].split(":")[1]
-                    ext_map = {"image/jpeg": ".jpg", "image/png": ".png", "image/gif": ".gif", "image/webp": ".webp"}
-                    ext = ext_map.get(mime, ".jpg")
-                else:
-                    data = person.photo_base64
-                    ext = ".jpg"
-                
-                # Decode and save
-                photo_bytes = base64.b64decode(data)
-                filename = f"{person_id}{ext}"
-                filepath = UPLOADS_DIR / filename
-                with open(filepath, "wb") as f:
-                    f.write(photo_bytes)
-                
-                person.photo_path = f"uploads/{filename}"
-                person.photo_base64 = None  # Clear base64 after saving
-                logger.info("Restored photo for %s: %s", person.name, filepath)
-            except Exception as e:
-                logger.warning("Failed to restore photo for %s: %s", person.name, e)
-                person.photo_path = None
-                person.photo_base64 = None
-    
-    tree_state.save_state("import_json")  # Save old state for undo
-    tree_state.tree = tree_data  # Then set the imported tree
-    tree_state.touch()  # Update session timestamp
+
+    # Read the raw body and validate it exactly once, before any side
+    # effects: a body that fails validation must not plant files in the
+    # publicly-served uploads/ directory
+    try:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+
+    try:
+        tree_data = FamilyTree.model_validate(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+
+    # Restore base64 photos to disk and update photo_path; writes run
+    # concurrently and go through a temp name so a crash mid-import
+    # never leaves a truncated photo at the final path
+    async def restore_photo(person_id: str, person: Person):
+        try:
+            photo_base64 = person.photo_base64
+            # Parse data URL: data:image/jpeg;base64,/9j/4AAQ...
+            if photo_base64.startswith("data:"):
+                header, data = photo_base64.split(",", 1)
+                # Extension from mime type: slice "data:<mime>;..."
+                mime = header[5:header.index(";")]
+                ext = _EXT_BY_MIME.get(mime, ".jpg")
+            else:
+                data = photo_base64
+                ext = ".jpg"
+
+            # Decode and save. Person ids come from the imported JSON,
+            # so strip any path components a crafted id could use to
+            # escape the uploads directory
+            photo_bytes = base64.b64decode(data)
+            safe_id = os.path.basename(person_id.replace("\\", "/"))
+            if not safe_id or safe_id in (".", ".."):
+                raise ValueError(f"unsafe person id for photo: {person_id!r}")
+            filename = f"{safe_id}{ext}"
+            filepath = UPLOADS_DIR / filename
+            tmp_path = UPLOADS_DIR / f"{filename}.tmp"
+            async with aiofiles.open(tmp_path, "wb") as f:
+                await f.write(photo_bytes)
+            os.replace(tmp_path, filepath)
+
+            person.photo_path = f"uploads/{filename}"
+            person.photo_base64 = None  # Clear base64 after saving
+            logger.info("Restored photo for %s: %s", person.name, filepath)
+        except Exception as e:
+            logger.warning("Failed to restore photo for %s: %s", person.name, e)
+            person.photo_path = None
+            person.photo_base64 = None
+
+    tasks = [
+        restore_photo(person_id, person)
+        for person_id, person in tree_data.persons.items()
+        if person.photo_base64
+    ]
+    if tasks:
+        await asyncio.gather(*tasks)
+
+    async with tree_state.lock:
+        tree_state.save_state("import_json")  # Save old state for undo
+        tree_state.tree = tree_data  # Then set the imported tree
+        tree_state.bump()
+        tree_state.touch()  # Update session timestamp
     
     logger.info("Imported tree with %d persons", len(tree_data.persons))
     return {"status": "imported", "persons": len(tree_data.persons)}
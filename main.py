@@ -1,13 +1,17 @@
 """
 Family Tree Application - FastAPI Entry Point
 """
+import asyncio
 import logging
+import secrets
+import threading
 import uuid
+from collections import OrderedDict, deque
 from pathlib import Path
-from copy import deepcopy
-from typing import Dict
 import time
 
+import jsonpatch
+import orjson
 from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
@@ -29,29 +33,105 @@ SESSION_CLEANUP_INTERVAL = 3600  # Cleanup old sessions every hour
 
 
 class TreeState:
-    """Manages the family tree state with undo/redo support."""
-    
+    """Manages the family tree state with undo/redo support.
+
+    History entries hold serialized tree states, not deep-copied object
+    graphs: every KEYFRAME_INTERVAL-th entry is a full orjson snapshot
+    ("key") and the entries between are JSON patches ("patch") against
+    their predecessor, so memory grows with the size of each edit rather
+    than the size of the tree. The head of the undo stack is always a
+    keyframe.
+    """
+
     MAX_HISTORY = 50
+    KEYFRAME_INTERVAL = 10  # Full snapshot every N history entries
+    FLUSH_DELAY = 0.15  # Coalescing window for rapid updates (seconds)
 
     def __init__(self):
         self.tree = FamilyTree()
-        self.undo_stack = []
-        self.redo_stack = []
+        self.undo_stack = deque()
+        self.redo_stack = deque()
         self.last_accessed = time.time()
+        # Serializes mutations within one session; reads stay lock-free
+        self.lock = asyncio.Lock()
+        self._dirty = False
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        # Monotonic mutation counter; tags the serialized-tree cache
+        self._version = 0
+        # Salts the ETag so counters from different sessions never match
+        self._etag_seed = secrets.token_hex(4)
+        self._dump_cache = None  # (version, dict) of the last tree_dump()
+        self._json_cache = None  # (version, bytes) of the last dump_json_bytes()
+        self._last_push_sig = None  # Tree signature at the last undo push
+        self._list_cache = {}  # kind -> (version, bytes) for list endpoints
+        self._last_pushed_state = None  # Dump of the top undo entry's state
+        self._since_keyframe = 0  # Patch entries since the last keyframe
+        self._last_flushed_version = 0  # Version at the last flush
 
     def touch(self):
         """Update last accessed time."""
         self.last_accessed = time.time()
 
+    def _tree_sig(self) -> tuple:
+        """Cheap structural signature of the current tree."""
+        return (
+            self._version,
+            len(self.tree.persons),
+            len(self.tree.marriages),
+            len(self.tree.parent_child),
+        )
+
+    def _push_history(self, action: str, state: dict):
+        """Push a state onto the undo stack as a keyframe or a patch."""
+        if (
+            not self.undo_stack
+            or self._since_keyframe >= self.KEYFRAME_INTERVAL
+        ):
+            entry = (action, "key", orjson.dumps(state))
+            self._since_keyframe = 0
+        else:
+            patch = jsonpatch.make_patch(self._last_pushed_state, state).patch
+            entry = (action, "patch", patch)
+            self._since_keyframe += 1
+        self.undo_stack.append(entry)
+        self._last_pushed_state = state
+
+        # Limit history size; eviction is manual (no deque maxlen)
+        # because the new head must be promoted back to a keyframe
+        if len(self.undo_stack) > self.MAX_HISTORY:
+            _, _, head_snapshot = self.undo_stack.popleft()
+            if self.undo_stack and self.undo_stack[0][1] == "patch":
+                head_action, _, head_patch = self.undo_stack[0]
+                head_state = jsonpatch.apply_patch(
+                    orjson.loads(head_snapshot), head_patch
+                )
+                self.undo_stack[0] = (head_action, "key", orjson.dumps(head_state))
+
+    def _materialize_top(self) -> dict | None:
+        """Rebuild the state of the top undo entry from its keyframe."""
+        if not self.undo_stack:
+            return None
+        for i in range(len(self.undo_stack) - 1, -1, -1):
+            if self.undo_stack[i][1] == "key":
+                state = orjson.loads(self.undo_stack[i][2])
+                for j in range(i + 1, len(self.undo_stack)):
+                    state = jsonpatch.apply_patch(state, self.undo_stack[j][2])
+                return state
+        raise RuntimeError("undo history has no keyframe")
+
     def save_state(self, action: str):
         """Save current state for undo."""
-        state = deepcopy(self.tree)
-        self.undo_stack.append((action, state))
-        
-        # Limit history size
-        if len(self.undo_stack) > self.MAX_HISTORY:
-            self.undo_stack.pop(0)
-        
+        # Skip the snapshot when nothing mutated since the last push
+        # (e.g. a handler snapshotted and then aborted with a 4xx)
+        sig = self._tree_sig()
+        if self.undo_stack and sig == self._last_push_sig:
+            self.touch()
+            return
+
+        self._push_history(action, self.tree.model_dump())
+        self._last_push_sig = sig
+
         # Clear redo stack on new action
         self.redo_stack.clear()
         self.touch()
@@ -60,26 +140,115 @@ class TreeState:
         """Mark as accessed (no disk save in stateless mode)."""
         self.touch()
 
+    @property
+    def version(self) -> int:
+        """Current mutation version."""
+        return self._version
+
+    @property
+    def etag(self) -> str:
+        """Weak ETag for the tree: session nonce plus mutation version.
+
+        Browser caches key on URL, not cookie, so a bare counter would
+        let a stale If-None-Match from an evicted session revalidate
+        against a fresh session whose counter reached the same value;
+        the nonce makes ETags from different sessions never match.
+        """
+        return f'W/"{self._etag_seed}-{self._version}"'
+
+    def bump(self):
+        """Record a mutation: advance the version and drop cached dumps."""
+        self._version += 1
+        self._dump_cache = None
+        self._json_cache = None
+
+    def tree_dump(self) -> dict:
+        """Serialized form of the tree, cached until the next mutation."""
+        if self._dump_cache is None or self._dump_cache[0] != self._version:
+            self._dump_cache = (self._version, self.tree.model_dump())
+        return self._dump_cache[1]
+
+    def dump_json_bytes(self) -> bytes:
+        """orjson-encoded tree, cached until the next mutation.
+
+        One entry per session; repeated GETs of an unchanged tree cost
+        a version compare instead of a full serialization pass.
+        """
+        if self._json_cache is None or self._json_cache[0] != self._version:
+            self._json_cache = (self._version, orjson.dumps(self.tree_dump()))
+        return self._json_cache[1]
+
+    def list_json_bytes(self, kind: str, build) -> bytes:
+        """JSON bytes for a list endpoint, cached until the next mutation.
+
+        `build` produces the serializable list; it only runs on a cache
+        miss, so repeated reads of an unchanged tree are a dict lookup.
+        """
+        cached = self._list_cache.get(kind)
+        if cached is None or cached[0] != self._version:
+            cached = (self._version, orjson.dumps(build()))
+            self._list_cache[kind] = cached
+        return cached[1]
+
+    def mark_dirty(self):
+        """Flag the tree as modified and schedule a coalesced flush.
+
+        Rapid-fire updates (e.g. drag sessions sending a position per frame)
+        share a single pending flush instead of flushing per request.
+        """
+        self.bump()
+        self._dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        """Wait out the coalescing window, then flush once."""
+        await asyncio.sleep(self.FLUSH_DELAY)
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            # Nothing new since the last flush (e.g. an overlapping
+            # flush already covered these updates): skip the no-op
+            if self._version == self._last_flushed_version:
+                return
+            self._last_flushed_version = self._version
+            self.force_save()
+
     def undo(self) -> bool:
         """Undo the last action."""
         if not self.undo_stack:
             return False
-        
-        action, state = self.undo_stack.pop()
-        self.redo_stack.append((action, deepcopy(self.tree)))
-        self.tree = state
+
+        # The top entry's state is cached; no patch walk needed yet
+        restored = self._last_pushed_state
+        action = self.undo_stack[-1][0]
+        self.redo_stack.append((action, self.tree.model_dump()))
+        self.undo_stack.pop()
+        self._last_pushed_state = self._materialize_top()
+        self._last_push_sig = None
+
+        self.tree = FamilyTree.model_validate(restored)
+        self.bump()
+        # The restored snapshot *is* the serialized form of the new
+        # tree, so warm the dump cache with it instead of re-dumping
+        # on the next GET
+        self._dump_cache = (self._version, restored)
         self.touch()
         logger.info("Undid action: %s", action)
         return True
-    
+
     def redo(self) -> bool:
         """Redo the last undone action."""
         if not self.redo_stack:
             return False
-        
+
         action, state = self.redo_stack.pop()
-        self.undo_stack.append((action, deepcopy(self.tree)))
-        self.tree = state
+        self._push_history(action, self.tree.model_dump())
+        self._last_push_sig = None
+        self.tree = FamilyTree.model_validate(state)
+        self.bump()
+        self._dump_cache = (self._version, state)
         self.touch()
         logger.info("Redid action: %s", action)
         return True
@@ -92,63 +261,78 @@ class TreeState:
 
 
 class SessionManager:
-    """Manages per-user sessions with memory protection."""
-    
+    """Manages per-user sessions with memory protection.
+
+    Sessions live in an OrderedDict kept in least-recently-used order:
+    every access moves the session to the tail, so eviction at the cap
+    and expiry scans both work from the head in O(1) per session.
+    """
+
     def __init__(self):
-        self.sessions: Dict[str, TreeState] = {}
+        self.sessions: OrderedDict[str, TreeState] = OrderedDict()
         self.last_cleanup = time.time()
-    
+        self._lock = threading.Lock()
+
     def get_or_create_session(self, session_id: str = None) -> tuple[str, TreeState]:
         """Get existing session or create new one."""
-        self._cleanup_old_sessions()
-        
-        if session_id and session_id in self.sessions:
-            state = self.sessions[session_id]
-            state.touch()
-            return session_id, state
-        
-        # Create new session
-        new_id = str(uuid.uuid4())
-        
-        # Memory protection: remove oldest session if at limit
-        if len(self.sessions) >= MAX_SESSIONS:
-            oldest_id = min(self.sessions.keys(), 
-                          key=lambda k: self.sessions[k].last_accessed)
-            del self.sessions[oldest_id]
-            logger.info("Removed oldest session %s to make room", oldest_id[:8])
-        
-        self.sessions[new_id] = TreeState()
-        logger.info("Created new session: %s", new_id[:8])
-        return new_id, self.sessions[new_id]
-    
+        with self._lock:
+            self._cleanup_old_sessions()
+
+            if session_id and session_id in self.sessions:
+                state = self.sessions[session_id]
+                state.touch()
+                self.sessions.move_to_end(session_id)
+                return session_id, state
+
+            # Create new session
+            new_id = str(uuid.uuid4())
+
+            # Memory protection: drop the LRU session if at limit
+            if len(self.sessions) >= MAX_SESSIONS:
+                oldest_id, _ = self.sessions.popitem(last=False)
+                logger.info("Removed oldest session %s to make room", oldest_id[:8])
+
+            state = TreeState()
+            self.sessions[new_id] = state
+            logger.info("Created new session: %s", new_id[:8])
+            return new_id, state
+
     def get_session(self, session_id: str) -> TreeState | None:
         """Get session by ID, returns None if not found."""
-        if session_id in self.sessions:
-            self.sessions[session_id].touch()
-            return self.sessions[session_id]
-        return None
-    
+        with self._lock:
+            state = self.sessions.get(session_id)
+            if state is not None:
+                state.touch()
+                self.sessions.move_to_end(session_id)
+            return state
+
     def _cleanup_old_sessions(self):
-        """Remove sessions that haven't been accessed in a while."""
+        """Remove sessions that haven't been accessed in a while.
+
+        Caller holds the lock. LRU order means the scan can stop at the
+        first non-expired session instead of walking the whole table.
+        """
         now = time.time()
         if now - self.last_cleanup < SESSION_CLEANUP_INTERVAL:
             return
-        
+
         self.last_cleanup = now
-        expired = [
-            sid for sid, state in self.sessions.items()
-            if now - state.last_accessed > SESSION_MAX_AGE
-        ]
-        for sid in expired:
+        while self.sessions:
+            sid, state = next(iter(self.sessions.items()))
+            if now - state.last_accessed <= SESSION_MAX_AGE:
+                break
             del self.sessions[sid]
             logger.info("Cleaned up expired session: %s", sid[:8])
 
 
 # Initialize app and session manager
+# No custom default_response_class: on current FastAPI it is deprecated
+# and disables the pydantic-core dump_json fast path for response_model
+# routes, and the hot endpoints already return pre-encoded orjson bytes
 app = FastAPI(
     title="Family Tree Builder",
     description="A web-based family tree creation and visualization tool",
-    version="1.0.0"
+    version="1.0.0",
 )
 
 session_manager = SessionManager()
@@ -1,15 +1,17 @@
 """
 Pydantic models for the Family Tree application.
 """
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, Set
+from pydantic import BaseModel, Field, PrivateAttr, field_serializer, field_validator, model_validator
 from datetime import datetime
-import uuid
+import secrets
+
+import orjson
 
 
 def generate_id() -> str:
-    """Generate a unique ID."""
-    return str(uuid.uuid4())
+    """Generate a unique opaque ID (32 hex chars, 128 random bits)."""
+    return secrets.token_hex(16)
 
 
 class Person(BaseModel):
@@ -25,6 +27,16 @@ class Person(BaseModel):
     x: float = 0.0
     y: float = 0.0
 
+    @classmethod
+    def fast(cls, **data) -> "Person":
+        """Build without validation from already-validated field data.
+
+        model_construct skips validators and coercion but still applies
+        defaults, so the generated id works as usual. Only for internal
+        data — user-supplied input must go through the normal constructor.
+        """
+        return cls.model_construct(**data)
+
 
 class PersonCreate(BaseModel):
     """Model for creating a new person."""
@@ -56,6 +68,13 @@ class PositionUpdate(BaseModel):
     y: float
 
 
+class PositionBatchItem(BaseModel):
+    """Model for one entry in a bulk position update."""
+    id: str
+    x: float
+    y: float
+
+
 class Marriage(BaseModel):
     """Model representing a marriage between two persons."""
     id: str = Field(default_factory=generate_id)
@@ -64,6 +83,11 @@ class Marriage(BaseModel):
     marriage_date: Optional[str] = None
     order: int = 1  # Order of this marriage for the spouses
 
+    @classmethod
+    def fast(cls, **data) -> "Marriage":
+        """Build without validation from already-validated field data."""
+        return cls.model_construct(**data)
+
 
 class MarriageCreate(BaseModel):
     """Model for creating a marriage."""
@@ -78,6 +102,11 @@ class ParentChild(BaseModel):
     child_id: str
     marriage_id: Optional[str] = None  # Which marriage this child belongs to
 
+    @classmethod
+    def fast(cls, **data) -> "ParentChild":
+        """Build without validation from already-validated field data."""
+        return cls.model_construct(**data)
+
 
 class ParentChildCreate(BaseModel):
     """Model for creating a parent-child relationship."""
@@ -86,20 +115,161 @@ class ParentChildCreate(BaseModel):
     marriage_id: Optional[str] = None
 
 
+def pc_key(parent_id: str, child_id: str) -> str:
+    """Dictionary key for a parent-child relation."""
+    return f"{parent_id}:{child_id}"
+
+
 class FamilyTree(BaseModel):
-    """Model representing the entire family tree."""
+    """Model representing the entire family tree.
+
+    Parent-child relations are stored in a dict keyed by (parent, child)
+    so duplicate checks and removals are O(1) instead of list scans.
+    Inverted indices (children per parent, parents per child, relations
+    per marriage) make cascade deletes O(degree); they are rebuilt on
+    validation and kept in sync by the mutation helpers below.
+    """
     persons: Dict[str, Person] = Field(default_factory=dict)
     marriages: Dict[str, Marriage] = Field(default_factory=dict)
-    parent_child: List[ParentChild] = Field(default_factory=list)
+    parent_child: Dict[str, ParentChild] = Field(default_factory=dict)
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
+    # Inverted relation indices (never serialized, rebuilt on validation)
+    _children_of: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    _parents_of: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    _relations_of_marriage: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    _marriages_of: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+
+    @field_validator("parent_child", mode="before")
+    @classmethod
+    def _accept_relation_list(cls, value):
+        """Accept the serialized list form and key it by (parent, child)."""
+        if isinstance(value, list):
+            indexed = {}
+            for pc in value:
+                if isinstance(pc, dict):
+                    indexed[pc_key(pc["parent_id"], pc["child_id"])] = pc
+                else:
+                    indexed[pc_key(pc.parent_id, pc.child_id)] = pc
+            return indexed
+        return value
+
+    @field_serializer("parent_child")
+    def _serialize_relation_list(self, value: Dict[str, ParentChild]):
+        """Serialize back to the list form clients and exports expect."""
+        return list(value.values())
+
+    @model_validator(mode="after")
+    def _build_indices(self):
+        self._children_of = {}
+        self._parents_of = {}
+        self._relations_of_marriage = {}
+        self._marriages_of = {}
+        for pc in self.parent_child.values():
+            self._index_relation(pc)
+        for marriage in self.marriages.values():
+            self._index_marriage(marriage)
+        return self
+
+    def _index_marriage(self, marriage: Marriage):
+        self._marriages_of.setdefault(marriage.spouse1_id, set()).add(marriage.id)
+        self._marriages_of.setdefault(marriage.spouse2_id, set()).add(marriage.id)
+
+    def _unindex_marriage(self, marriage: Marriage):
+        for spouse_id in (marriage.spouse1_id, marriage.spouse2_id):
+            marriage_ids = self._marriages_of.get(spouse_id)
+            if marriage_ids:
+                marriage_ids.discard(marriage.id)
+
+    def marriage_ids_of(self, person_id: str) -> Set[str]:
+        """IDs of every marriage the person is a spouse in. O(1)."""
+        return self._marriages_of.get(person_id, set())
+
+    def add_marriage(self, marriage: Marriage):
+        """Store a marriage and index it by spouse."""
+        self.marriages[marriage.id] = marriage
+        self._index_marriage(marriage)
+
+    def remove_marriage(self, marriage_id: str) -> Optional[Marriage]:
+        """Remove one marriage, returning it, or None if absent."""
+        marriage = self.marriages.pop(marriage_id, None)
+        if marriage is not None:
+            self._unindex_marriage(marriage)
+        return marriage
+
+    def _index_relation(self, pc: ParentChild):
+        self._children_of.setdefault(pc.parent_id, set()).add(pc.child_id)
+        self._parents_of.setdefault(pc.child_id, set()).add(pc.parent_id)
+        if pc.marriage_id:
+            self._relations_of_marriage.setdefault(pc.marriage_id, set()).add(
+                pc_key(pc.parent_id, pc.child_id)
+            )
+
+    def _unindex_relation(self, pc: ParentChild):
+        key = pc_key(pc.parent_id, pc.child_id)
+        children = self._children_of.get(pc.parent_id)
+        if children:
+            children.discard(pc.child_id)
+        parents = self._parents_of.get(pc.child_id)
+        if parents:
+            parents.discard(pc.parent_id)
+        if pc.marriage_id:
+            relations = self._relations_of_marriage.get(pc.marriage_id)
+            if relations:
+                relations.discard(key)
+
+    def has_parent_child(self, parent_id: str, child_id: str) -> bool:
+        """Check whether a parent-child relation exists. O(1)."""
+        return pc_key(parent_id, child_id) in self.parent_child
+
+    def add_parent_child(self, pc: ParentChild):
+        """Store a parent-child relation and index it."""
+        self.parent_child[pc_key(pc.parent_id, pc.child_id)] = pc
+        self._index_relation(pc)
+
+    def remove_parent_child(self, parent_id: str, child_id: str) -> Optional[ParentChild]:
+        """Remove one relation, returning it, or None if absent."""
+        pc = self.parent_child.pop(pc_key(parent_id, child_id), None)
+        if pc is not None:
+            self._unindex_relation(pc)
+        return pc
+
+    def remove_person_relations(self, person_id: str):
+        """Drop every relation where the person is parent or child. O(degree)."""
+        for child_id in list(self._children_of.get(person_id, ())):
+            self.remove_parent_child(person_id, child_id)
+        for parent_id in list(self._parents_of.get(person_id, ())):
+            self.remove_parent_child(parent_id, person_id)
+
+    def remove_marriage_relations(self, marriage_id: str):
+        """Drop every relation linked to a marriage. O(degree)."""
+        for key in list(self._relations_of_marriage.get(marriage_id, ())):
+            pc = self.parent_child.get(key)
+            if pc is not None:
+                self.remove_parent_child(pc.parent_id, pc.child_id)
+        self._relations_of_marriage.pop(marriage_id, None)
+
 
 class HistoryState(BaseModel):
-    """Model for storing undo/redo state."""
-    tree: FamilyTree
+    """Model for storing undo/redo state.
+
+    The tree is held as serialized orjson bytes rather than a live
+    FamilyTree, so capturing a history entry costs one C-speed
+    serialization instead of a deep copy of the whole model graph.
+    """
+    tree_blob: bytes
     action: str
     timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
 
+    @classmethod
+    def capture(cls, tree: FamilyTree, action: str) -> "HistoryState":
+        """Snapshot a tree for the history stack."""
+        return cls(tree_blob=orjson.dumps(tree.model_dump()), action=action)
+
+    def restore(self) -> FamilyTree:
+        """Rehydrate the snapshot into a FamilyTree."""
+        return FamilyTree.model_validate(orjson.loads(self.tree_blob))
+
 
 class ExportOptions(BaseModel):
     """Model for export configuration."""
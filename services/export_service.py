@@ -5,53 +5,375 @@ import io
 import logging
 import os
 import tempfile
+from functools import lru_cache
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
+
+try:
+    # Optional JIT for the bezier inner loop; deliberately not a hard
+    # dependency — the numpy fallback below is used when absent
+    from numba import njit
+except ImportError:
+    njit = None
+
 from models import FamilyTree, ExportOptions
 
 logger = logging.getLogger(__name__)
 
 EXPORTS_DIR = Path("exports")
 
+# Below this fit-to-page scale a single-page PDF is unreadable, so the
+# export tiles the tree across multiple pages at natural scale instead
+TILE_MIN_SCALE = 0.3
+
+
+# Cubic Bernstein basis sampled once at import; every bezier edge in
+# the image exporter reuses these weights instead of re-deriving the
+# polynomial per point in Python
+_BEZIER_T = np.linspace(0.0, 1.0, 21)
+_BEZIER_B0 = (1 - _BEZIER_T) ** 3
+_BEZIER_B1 = 3 * (1 - _BEZIER_T) ** 2 * _BEZIER_T
+_BEZIER_B2 = 3 * (1 - _BEZIER_T) * _BEZIER_T ** 2
+_BEZIER_B3 = _BEZIER_T ** 3
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True)
+    def _bezier_curve(x0, y0, x1, y1, x2, y2, x3, y3):
+        """Sample the cubic at 21 points in a native-compiled loop."""
+        xs = np.empty(21)
+        ys = np.empty(21)
+        for i in range(21):
+            t = i / 20.0
+            u = 1.0 - t
+            b0 = u * u * u
+            b1 = 3.0 * u * u * t
+            b2 = 3.0 * u * t * t
+            b3 = t * t * t
+            xs[i] = b0 * x0 + b1 * x1 + b2 * x2 + b3 * x3
+            ys[i] = b0 * y0 + b1 * y1 + b2 * y2 + b3 * y3
+        return xs, ys
+else:
+    def _bezier_curve(x0, y0, x1, y1, x2, y2, x3, y3):
+        """Sample the cubic via the precomputed Bernstein weights."""
+        xs = _BEZIER_B0 * x0 + _BEZIER_B1 * x1 + _BEZIER_B2 * x2 + _BEZIER_B3 * x3
+        ys = _BEZIER_B0 * y0 + _BEZIER_B1 * y1 + _BEZIER_B2 * y2 + _BEZIER_B3 * y3
+        return xs, ys
+
+
+# Lazily imported renderer namespaces, loaded on first export so app
+# startup stays light but repeat exports skip the import machinery
+_rl = None
+_pil = None
+
+
+def _load_reportlab():
+    """Import the reportlab pieces the PDF exporter needs, once."""
+    global _rl
+    if _rl is None:
+        from reportlab.lib.pagesizes import A4, A3, A2, A1, A0, B0, LETTER, LEGAL, TABLOID, landscape, portrait
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.units import mm, inch
+        from reportlab.pdfbase.pdfmetrics import stringWidth
 
-def export_tree(tree: FamilyTree, options: ExportOptions) -> str:
+        # Standard page sizes plus large format
+        page_sizes = {
+            "A4": A4,
+            "A3": A3,
+            "A2": A2,
+            "A1": A1,
+            "A0": A0,
+            "B0": B0,
+            "Letter": LETTER,
+            "Legal": LEGAL,
+            "Tabloid": TABLOID,
+            "Arch-E": (36 * inch, 48 * inch),  # Architectural E size
+            "Custom-Large": (1200 * mm, 900 * mm),  # Custom large format
+        }
+        _rl = (canvas, stringWidth, landscape, portrait, page_sizes)
+    return _rl
+
+
+def _load_pil():
+    """Import the PIL pieces the image exporter needs, once."""
+    global _pil
+    if _pil is None:
+        from PIL import Image, ImageDraw
+        _pil = (Image, ImageDraw)
+    return _pil
+
+
+@lru_cache(maxsize=8)
+def _get_font(path: str, size: int):
+    """TrueType font cached across exports; falls back to PIL's default.
+
+    Loading a font stats and parses the file, so repeat exports at the
+    same scale should not pay it again.
+    """
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(path, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+# Gender codes for the columnar snapshot; 0 doubles as the fallback for
+# unknown or unexpected gender strings
+_GENDER_CODE = {"male": 1, "female": 2}
+
+# Node palettes indexed by gender code (unknown, male, female): one
+# sequence lookup per person instead of string comparisons
+_PDF_NODE_FILLS = (
+    (0.91, 0.91, 0.91),  # #e8e8e8
+    (0.816, 0.91, 1),  # #d0e8ff
+    (1, 0.816, 0.91),  # #ffd0e8
+)
+_PIL_NODE_FILLS = ("#e8e8e8", "#d0e8ff", "#ffd0e8")
+_NODE_FORMS = ("node_unknown", "node_male", "node_female")
+
+
+class _PersonColumns:
+    """Columnar (structure-of-arrays) snapshot of the persons.
+
+    The draw loops only need a handful of fixed columns per person;
+    pulling them out of the pydantic objects once turns the hot loops
+    into list/array indexing. Positions land in an (N, 2) float array
+    so bounds and the affine transform are single vector ops.
+    """
+
+    __slots__ = ("ids", "idx", "coords", "gender_codes", "persons", "name_lines")
+
+    def __init__(self, tree: FamilyTree):
+        self.ids = list(tree.persons)
+        self.idx = {pid: i for i, pid in enumerate(self.ids)}
+        self.persons = list(tree.persons.values())
+        # Display name split once per person: (top, bottom) with bottom
+        # None for names short enough to stay on one line
+        self.name_lines = []
+        for p in self.persons:
+            parts = p.name.split()
+            if len(parts) > 2:
+                self.name_lines.append((" ".join(parts[:2]), " ".join(parts[2:])))
+            else:
+                self.name_lines.append((p.name, None))
+        self.coords = np.fromiter(
+            (v for p in self.persons for v in (p.x, p.y)),
+            dtype=np.float64,
+            count=2 * len(self.ids),
+        ).reshape(-1, 2)
+        self.gender_codes = np.fromiter(
+            (_GENDER_CODE.get(p.gender, 0) for p in self.persons),
+            dtype=np.uint8,
+            count=len(self.ids),
+        )
+
+
+def _valid_edges(tree: FamilyTree, idx):
+    """Coordinate-row pairs for edges whose endpoints both exist.
+
+    Filtering once up front keeps the membership checks (two dict
+    probes per edge) out of the draw loops; the tuples index straight
+    into the transformed coordinate arrays.
+    """
+    marriage_rows = []
+    for marriage in tree.marriages.values():
+        i = idx.get(marriage.spouse1_id)
+        j = idx.get(marriage.spouse2_id)
+        if i is not None and j is not None:
+            marriage_rows.append((i, j))
+
+    child_rows = []
+    for pc in tree.parent_child.values():
+        i = idx.get(pc.parent_id)
+        j = idx.get(pc.child_id)
+        if i is not None and j is not None:
+            child_rows.append((i, j))
+
+    return marriage_rows, child_rows
+
+
+def export_tree(tree: FamilyTree, options: ExportOptions, tag: str = "") -> str:
     """
     Export the family tree as an image or PDF.
-    Returns the path to the generated file.
+    Returns the path to the generated file. `tag` is appended to the
+    timestamp so batch callers can keep same-second jobs from colliding.
     """
     EXPORTS_DIR.mkdir(exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") + tag
+
     if options.format == "pdf":
         return export_pdf(tree, options, timestamp)
     else:
         return export_image(tree, options, timestamp)
 
 
+def export_many(tree: FamilyTree, options_list: list) -> list:
+    """Render several exports of the same tree in parallel.
+
+    Rendering is CPU-bound and PIL/reportlab hold the GIL for most of
+    it, so independent outputs (e.g. PNG and PDF requested together)
+    scale across worker processes. A single job skips the pool and its
+    pickling overhead.
+    """
+    if len(options_list) <= 1:
+        return [export_tree(tree, options) for options in options_list]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Per-job filename suffix: every worker stamps the same second, so
+    # two jobs with the same format would otherwise clobber each other
+    tags = [f"_{i:02d}" for i in range(len(options_list))]
+
+    workers = min(len(options_list), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(export_tree, [tree] * len(options_list), options_list, tags))
+
+
+def _define_node_forms(c, node_width, node_height, corner_radius):
+    """Emit the per-gender rounded-rect form XObjects into a canvas."""
+    for form_name, fill_color in zip(_NODE_FORMS, _PDF_NODE_FILLS):
+        c.beginForm(
+            form_name,
+            lowerx=-node_width / 2, lowery=-node_height / 2,
+            upperx=node_width / 2, uppery=node_height / 2,
+        )
+        c.setFillColorRGB(*fill_color)
+        c.setStrokeColorRGB(0, 0, 0)
+        c.setLineWidth(1)
+        c.roundRect(-node_width / 2, -node_height / 2, node_width, node_height,
+                    corner_radius, stroke=1, fill=1)
+        c.endForm()
+
+
+def _export_pdf_tiled(c, tree, cols, mn, width, height, margin, stringWidth):
+    """Render the tree at natural scale across a grid of pages.
+
+    The drawing area is partitioned into page-sized world windows; each
+    window becomes its own page and only the nodes and edges whose
+    bounding boxes touch it are drawn, so work per page stays roughly
+    proportional to what is visible on it.
+    """
+    coords = cols.coords
+    available_width = width - 2 * margin
+    available_height = height - 2 * margin
+
+    # World-space positions, padded like the single-page transform
+    wx = coords[:, 0] - mn[0] + 100
+    wy = coords[:, 1] - mn[1] + 100
+    pages_x = max(1, int(np.ceil((wx.max() + 100) / available_width)))
+    pages_y = max(1, int(np.ceil((wy.max() + 100) / available_height)))
+
+    marriage_rows, child_rows = _valid_edges(tree, cols.idx)
+    m_idx = np.asarray(marriage_rows, dtype=np.intp).reshape(-1, 2)
+    pc_idx = np.asarray(child_rows, dtype=np.intp).reshape(-1, 2)
+
+    node_width = 80.0
+    node_height = 50.0
+    _define_node_forms(c, node_width, node_height, 5.0)
+
+    # Cull slack so nodes and labels straddling a page seam still draw
+    pad = node_width
+
+    name_font, name_size = "Helvetica-Bold", 8
+    date_font, date_size = "Helvetica", 6
+    gender_codes = cols.gender_codes
+
+    for page_row in range(pages_y):
+        for page_col in range(pages_x):
+            # Per-page transform: shift the world window onto the page
+            ptx = margin + (wx - page_col * available_width)
+            pty = height - margin - (wy - page_row * available_height)
+
+            visible = np.nonzero(
+                (ptx >= -pad) & (ptx <= width + pad)
+                & (pty >= -pad) & (pty <= height + pad)
+            )[0]
+
+            def cull_edges(idx):
+                """Rows of idx whose bounding box touches this page."""
+                ex, ey = ptx[idx], pty[idx]
+                return np.nonzero(
+                    (ex.min(1) <= width + pad) & (ex.max(1) >= -pad)
+                    & (ey.min(1) <= height + pad) & (ey.max(1) >= -pad)
+                )[0]
+
+            m_rows = cull_edges(m_idx) if len(m_idx) else ()
+            pc_rows = cull_edges(pc_idx) if len(pc_idx) else ()
+
+            # Nothing lands on this tile: skip it entirely rather than
+            # emitting a blank page
+            if not (len(visible) or len(m_rows) or len(pc_rows)):
+                continue
+
+            c.setStrokeColorRGB(0.3, 0.3, 0.3)
+            c.setLineWidth(1)
+
+            if len(m_rows):
+                c.lines([(ptx[i], pty[i], ptx[j], pty[j])
+                         for i, j in m_idx[m_rows]])
+
+            if len(pc_rows):
+                p = c.beginPath()
+                for k in pc_rows:
+                    i, j = pc_idx[k]
+                    px, py = ptx[i], pty[i]
+                    cx, cy = ptx[j], pty[j]
+                    mid_y = (py + cy) / 2
+                    p.moveTo(px, py)
+                    p.curveTo(px, mid_y, cx, mid_y, cx, cy)
+                c.drawPath(p, stroke=1, fill=0)
+
+            c.setFillColorRGB(0, 0, 0)
+            for i in visible:
+                person = cols.persons[i]
+                x, y = ptx[i], pty[i]
+
+                c.saveState()
+                c.translate(x, y)
+                c.doForm(_NODE_FORMS[gender_codes[i]])
+                c.restoreState()
+
+                text = c.beginText()
+                text.setFont(name_font, name_size)
+                top, bottom = cols.name_lines[i]
+                if bottom is not None:
+                    text.setTextOrigin(x - stringWidth(top, name_font, name_size) / 2, y + 4)
+                    text.textOut(top)
+                    text.setTextOrigin(x - stringWidth(bottom, name_font, name_size) / 2, y - 8)
+                    text.textOut(bottom)
+                else:
+                    text.setTextOrigin(x - stringWidth(top, name_font, name_size) / 2, y)
+                    text.textOut(top)
+
+                dates = []
+                if person.date_of_birth:
+                    dates.append(f"b. {person.date_of_birth}")
+                if person.date_of_death:
+                    dates.append(f"d. {person.date_of_death}")
+                if dates:
+                    date_text = " | ".join(dates)
+                    text.setFont(date_font, date_size)
+                    text.setTextOrigin(
+                        x - stringWidth(date_text, date_font, date_size) / 2,
+                        y - node_height / 2 - 10,
+                    )
+                    text.textOut(date_text)
+
+                c.drawText(text)
+
+            c.showPage()
+
+    logger.info("Tiled PDF export: %d x %d pages", pages_x, pages_y)
+
+
 def export_pdf(tree: FamilyTree, options: ExportOptions, timestamp: str) -> str:
     """Export tree as PDF."""
-    from reportlab.lib.pagesizes import A4, A3, A2, A1, A0, B0, LETTER, LEGAL, TABLOID, landscape, portrait
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import mm, inch
-    
-    # Standard page sizes plus large format
-    page_sizes = {
-        "A4": A4,
-        "A3": A3,
-        "A2": A2,
-        "A1": A1,
-        "A0": A0,
-        "B0": B0,
-        "Letter": LETTER,
-        "Legal": LEGAL,
-        "Tabloid": TABLOID,
-        "Arch-E": (36 * inch, 48 * inch),  # Architectural E size
-        "Custom-Large": (1200 * mm, 900 * mm),  # Custom large format
-    }
-    
-    page_size = page_sizes.get(options.page_size, A4)
+    canvas, stringWidth, landscape, portrait, page_sizes = _load_reportlab()
+
+    page_size = page_sizes.get(options.page_size, page_sizes["A4"])
     if options.orientation == "landscape":
         page_size = landscape(page_size)
     else:
@@ -68,112 +390,119 @@ def export_pdf(tree: FamilyTree, options: ExportOptions, timestamp: str) -> str:
         c.save()
         return str(filepath)
     
-    # Calculate bounds
-    min_x = min(p.x for p in tree.persons.values())
-    max_x = max(p.x for p in tree.persons.values())
-    min_y = min(p.y for p in tree.persons.values())
-    max_y = max(p.y for p in tree.persons.values())
-    
-    tree_width = max_x - min_x + 200
-    tree_height = max_y - min_y + 200
-    
+    # Calculate bounds from the columnar snapshot (one pass)
+    cols = _PersonColumns(tree)
+    coords = cols.coords
+    mn = coords.min(0)
+    mx = coords.max(0)
+
+    tree_width = mx[0] - mn[0] + 200
+    tree_height = mx[1] - mn[1] + 200
+
     # Calculate scale
     margin = 50
     available_width = width - 2 * margin
     available_height = height - 2 * margin
-    
+
     scale_x = available_width / tree_width if tree_width > 0 else 1
     scale_y = available_height / tree_height if tree_height > 0 else 1
     scale = min(scale_x, scale_y, 1)
-    
-    def transform_x(x):
-        return margin + (x - min_x + 100) * scale
-    
-    def transform_y(y):
-        return height - margin - (y - min_y + 100) * scale
-    
+
+    if scale < TILE_MIN_SCALE:
+        _export_pdf_tiled(c, tree, cols, mn, width, height, margin, stringWidth)
+        c.save()
+        logger.info("Exported tiled PDF: %s", filepath)
+        return str(filepath)
+
+    # Transform every position in two vector ops; the draw loops then
+    # index tx/ty instead of calling a closure per endpoint
+    tx = margin + (coords[:, 0] - mn[0] + 100) * scale
+    ty = height - margin - (coords[:, 1] - mn[1] + 100) * scale
+
+    marriage_rows, child_rows = _valid_edges(tree, cols.idx)
+
     # Draw connections first
     c.setStrokeColorRGB(0.3, 0.3, 0.3)
     c.setLineWidth(1)
-    
-    # Draw marriage lines
-    for marriage in tree.marriages.values():
-        if marriage.spouse1_id in tree.persons and marriage.spouse2_id in tree.persons:
-            p1 = tree.persons[marriage.spouse1_id]
-            p2 = tree.persons[marriage.spouse2_id]
-            
-            x1, y1 = transform_x(p1.x), transform_y(p1.y)
-            x2, y2 = transform_x(p2.x), transform_y(p2.y)
-            
-            c.line(x1, y1, x2, y2)
-    
-    # Draw parent-child lines
-    for pc in tree.parent_child:
-        if pc.parent_id in tree.persons and pc.child_id in tree.persons:
-            parent = tree.persons[pc.parent_id]
-            child = tree.persons[pc.child_id]
-            
-            px, py = transform_x(parent.x), transform_y(parent.y)
-            cx, cy = transform_x(child.x), transform_y(child.y)
-            
-            # Draw line from parent to child
+
+    # Draw marriage lines through the batch API: one path containing
+    # every segment instead of a canvas.line round trip per marriage
+    if marriage_rows:
+        c.lines([(tx[i], ty[i], tx[j], ty[j]) for i, j in marriage_rows])
+
+    # Draw parent-child lines: every curve is a moveTo/curveTo subpath
+    # of one path object, stroked with a single drawPath instead of a
+    # begin/draw round trip per edge
+    if child_rows:
+        p = c.beginPath()
+        for i, j in child_rows:
+            px, py = tx[i], ty[i]
+            cx, cy = tx[j], ty[j]
+
             mid_y = (py + cy) / 2
-            
-            p = c.beginPath()
+
             p.moveTo(px, py)
             # Bezier C px,mid_y cx,mid_y cx,cy
             p.curveTo(px, mid_y, cx, mid_y, cx, cy)
-            c.drawPath(p, stroke=1, fill=0)
-    
+        c.drawPath(p, stroke=1, fill=0)
+
     # Draw person nodes
     # Frontend uses approx 1.6 aspect ratio
     node_width = 80 * scale
     node_height = 50 * scale
     corner_radius = 5 * scale
-    
-    for person in tree.persons.values():
-        x, y = transform_x(person.x), transform_y(person.y)
-        
-        # Determine color
-        if person.gender == "male":
-            fill_color = (0.816, 0.91, 1)  # #d0e8ff
-            pil_fill = "#d0e8ff"
-        elif person.gender == "female":
-            fill_color = (1, 0.816, 0.91)  # #ffd0e8
-            pil_fill = "#ffd0e8"
-        else:
-            fill_color = (0.91, 0.91, 0.91)  # #e8e8e8
-            pil_fill = "#e8e8e8"
-            
-        c.setFillColorRGB(*fill_color)
-        c.setStrokeColorRGB(0, 0, 0)
-        c.setLineWidth(1)
-        
-        # Draw rounded rect centered at x, y
-        c.roundRect(x - node_width/2, y - node_height/2, node_width, node_height, corner_radius, stroke=1, fill=1)
-        
-        # Draw name
-        c.setFillColorRGB(0, 0, 0)
-        c.setFont("Helvetica-Bold", 8 * scale)
-        
-        name_parts = person.name.split()
-        if len(name_parts) > 2:
-            c.drawCentredString(x, y + 4, " ".join(name_parts[:2]))
-            c.drawCentredString(x, y - 8, " ".join(name_parts[2:]))
+
+    # One form XObject per gender: the rounded rect is emitted into the
+    # PDF once and each person becomes a translate + doForm reference,
+    # instead of repeating fill/stroke/rect commands per node. Form
+    # execution restores graphics state, so no colors leak between nodes.
+    _define_node_forms(c, node_width, node_height, corner_radius)
+
+    name_font, name_size = "Helvetica-Bold", 8 * scale
+    date_font, date_size = "Helvetica", 6 * scale
+    c.setFillColorRGB(0, 0, 0)  # Text color, set once for all nodes
+
+    gender_codes = cols.gender_codes
+    for i, person in enumerate(cols.persons):
+        x, y = tx[i], ty[i]
+
+        c.saveState()
+        c.translate(x, y)
+        c.doForm(_NODE_FORMS[gender_codes[i]])
+        c.restoreState()
+
+        # Name and dates in a single text object per person
+        text = c.beginText()
+        text.setFont(name_font, name_size)
+
+        top, bottom = cols.name_lines[i]
+        if bottom is not None:
+            text.setTextOrigin(x - stringWidth(top, name_font, name_size) / 2, y + 4)
+            text.textOut(top)
+            text.setTextOrigin(x - stringWidth(bottom, name_font, name_size) / 2, y - 8)
+            text.textOut(bottom)
         else:
-            c.drawCentredString(x, y, person.name)
-        
-        # Draw dates below node
-        c.setFont("Helvetica", 6 * scale)
+            text.setTextOrigin(x - stringWidth(top, name_font, name_size) / 2, y)
+            text.textOut(top)
+
+        # Dates below node
         dates = []
         if person.date_of_birth:
             dates.append(f"b. {person.date_of_birth}")
         if person.date_of_death:
             dates.append(f"d. {person.date_of_death}")
-        
+
         if dates:
-            c.drawCentredString(x, y - node_height/2 - 10, " | ".join(dates))
-    
+            date_text = " | ".join(dates)
+            text.setFont(date_font, date_size)
+            text.setTextOrigin(
+                x - stringWidth(date_text, date_font, date_size) / 2,
+                y - node_height / 2 - 10,
+            )
+            text.textOut(date_text)
+
+        c.drawText(text)
+
     c.save()
     logger.info("Exported PDF: %s", filepath)
     return str(filepath)
@@ -181,8 +510,8 @@ def export_pdf(tree: FamilyTree, options: ExportOptions, timestamp: str) -> str:
 
 def export_image(tree: FamilyTree, options: ExportOptions, timestamp: str) -> str:
     """Export tree as PNG or JPG image."""
-    from PIL import Image, ImageDraw, ImageFont
-    
+    Image, ImageDraw = _load_pil()
+
     width = options.width
     height = options.height
     
@@ -193,119 +522,104 @@ def export_image(tree: FamilyTree, options: ExportOptions, timestamp: str) -> st
     if not tree.persons:
         draw.text((50, 50), "Empty Family Tree", fill="black")
     else:
-        # Calculate bounds
-        min_x = min(p.x for p in tree.persons.values())
-        max_x = max(p.x for p in tree.persons.values())
-        min_y = min(p.y for p in tree.persons.values())
-        max_y = max(p.y for p in tree.persons.values())
-        
-        tree_width = max_x - min_x + 200
-        tree_height = max_y - min_y + 200
-        
+        # Calculate bounds from the columnar snapshot (one pass)
+        cols = _PersonColumns(tree)
+        coords = cols.coords
+        mn = coords.min(0)
+        mx = coords.max(0)
+
+        tree_width = mx[0] - mn[0] + 200
+        tree_height = mx[1] - mn[1] + 200
+
         # Calculate scale
         margin = 50
         available_width = width - 2 * margin
         available_height = height - 2 * margin
-        
+
         scale_x = available_width / tree_width if tree_width > 0 else 1
         scale_y = available_height / tree_height if tree_height > 0 else 1
         scale = min(scale_x, scale_y, 1)
+
+        # Vectorized transform shared by every edge and node below
+        tx = margin + (coords[:, 0] - mn[0] + 100) * scale
+        ty = margin + (coords[:, 1] - mn[1] + 100) * scale
+
+        def draw_bezier(p0, p1, p2, p3, fill="gray", width=1):
+            xs, ys = _bezier_curve(p0[0], p0[1], p1[0], p1[1],
+                                   p2[0], p2[1], p3[0], p3[1])
+            draw.line(list(zip(xs.tolist(), ys.tolist())), fill=fill, width=width)
         
-        def transform_x(x):
-            return margin + (x - min_x + 100) * scale
-        
-        def transform_y(y):
-            return margin + (y - min_y + 100) * scale
-
-        def draw_bezier(p0, p1, p2, p3, steps=20, fill="gray", width=1):
-            points = []
-            for i in range(steps + 1):
-                t = i / steps
-                # Cubic Bezier
-                x = (1-t)**3 * p0[0] + 3*(1-t)**2 * t * p1[0] + 3*(1-t) * t**2 * p2[0] + t**3 * p3[0]
-                y = (1-t)**3 * p0[1] + 3*(1-t)**2 * t * p1[1] + 3*(1-t) * t**2 * p2[1] + t**3 * p3[1]
-                points.append((x, y))
-            draw.line(points, fill=fill, width=width)
-        
+        marriage_rows, child_rows = _valid_edges(tree, cols.idx)
+
         # Draw marriage lines
-        for marriage in tree.marriages.values():
-            if marriage.spouse1_id in tree.persons and marriage.spouse2_id in tree.persons:
-                p1 = tree.persons[marriage.spouse1_id]
-                p2 = tree.persons[marriage.spouse2_id]
-                
-                x1, y1 = transform_x(p1.x), transform_y(p1.y)
-                x2, y2 = transform_x(p2.x), transform_y(p2.y)
-                
-                draw.line([(x1, y1), (x2, y2)], fill="gray", width=2)
-        
+        for i, j in marriage_rows:
+            draw.line([(tx[i], ty[i]), (tx[j], ty[j])], fill="gray", width=2)
+
         # Draw parent-child lines
-        for pc in tree.parent_child:
-            if pc.parent_id in tree.persons and pc.child_id in tree.persons:
-                parent = tree.persons[pc.parent_id]
-                child = tree.persons[pc.child_id]
-                
-                px, py = transform_x(parent.x), transform_y(parent.y)
-                cx, cy = transform_x(child.x), transform_y(child.y)
-                
-                mid_y = (py + cy) / 2
-                
-                # Bezier segments
-                p0 = (px, py)
-                p1 = (px, mid_y)
-                p2 = (cx, mid_y)
-                p3 = (cx, cy)
-                
-                draw_bezier(p0, p1, p2, p3, fill="gray", width=1)
+        for i, j in child_rows:
+            px, py = tx[i], ty[i]
+            cx, cy = tx[j], ty[j]
+
+            mid_y = (py + cy) / 2
+
+            # Bezier segments
+            p0 = (px, py)
+            p1 = (px, mid_y)
+            p2 = (cx, mid_y)
+            p3 = (cx, cy)
+
+            draw_bezier(p0, p1, p2, p3, fill="gray", width=1)
         
-        # Draw person nodes
+        # Draw person nodes. Fit-to-canvas keeps everything inside the
+        # margins, so there is nothing offscreen to cull — but a huge
+        # tree can crush nodes below one pixel of area, at which point
+        # the rectangles and labels cannot produce visible output and
+        # the whole node pass is skipped (edges still show structure).
         node_width = 80 * scale
         node_height = 50 * scale
-        
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", int(10 * scale))
-            small_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", int(8 * scale))
-        except OSError:
-            font = ImageFont.load_default()
-            small_font = font
-        
-        for person in tree.persons.values():
-            x, y = int(transform_x(person.x)), int(transform_y(person.y))
-            
-            # Determine color
-            if person.gender == "male":
-                pil_fill = "#d0e8ff"
-            elif person.gender == "female":
-                pil_fill = "#ffd0e8"
-            else:
-                pil_fill = "#e8e8e8"
-            
-            # Draw rounded rectangle
-            x0, y0 = x - node_width/2, y - node_height/2
-            x1, y1 = x + node_width/2, y + node_height/2
-            draw.rounded_rectangle([x0, y0, x1, y1], radius=5, fill=pil_fill, outline="black", width=1)
-            
-            # Draw name
-            bbox = draw.textbbox((0, 0), person.name, font=font)
-            text_width = bbox[2] - bbox[0]
-            draw.text((x - text_width // 2, y - 6), person.name, fill="black", font=font)
-            
-            # Draw dates
-            dates = []
-            if person.date_of_birth:
-                dates.append(f"b. {person.date_of_birth}")
-            if person.date_of_death:
-                dates.append(f"d. {person.date_of_death}")
-            
-            if dates:
-                date_text = " | ".join(dates)
-                bbox = draw.textbbox((0, 0), date_text, font=small_font)
-                text_width = bbox[2] - bbox[0]
-                draw.text(
-                    (x - text_width // 2, y + node_height/2 + 5),
-                    date_text,
-                    fill="gray",
-                    font=small_font
-                )
+
+        if node_width * node_height >= 1.0:
+            # Labels render nothing useful once the font drops below a
+            # pixel; skip text work entirely in that regime
+            draw_labels = int(8 * scale) >= 1
+            if draw_labels:
+                font = _get_font("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", int(10 * scale))
+                small_font = _get_font("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", int(8 * scale))
+
+            gender_codes = cols.gender_codes
+            for i, person in enumerate(cols.persons):
+                x, y = int(tx[i]), int(ty[i])
+
+                pil_fill = _PIL_NODE_FILLS[gender_codes[i]]
+
+                # Draw rounded rectangle
+                x0, y0 = x - node_width/2, y - node_height/2
+                x1, y1 = x + node_width/2, y + node_height/2
+                draw.rounded_rectangle([x0, y0, x1, y1], radius=5, fill=pil_fill, outline="black", width=1)
+
+                if not draw_labels:
+                    continue
+
+                # Draw name (getlength is much cheaper than a full textbbox)
+                text_width = font.getlength(person.name)
+                draw.text((x - text_width // 2, y - 6), person.name, fill="black", font=font)
+
+                # Draw dates
+                dates = []
+                if person.date_of_birth:
+                    dates.append(f"b. {person.date_of_birth}")
+                if person.date_of_death:
+                    dates.append(f"d. {person.date_of_death}")
+
+                if dates:
+                    date_text = " | ".join(dates)
+                    text_width = small_font.getlength(date_text)
+                    draw.text(
+                        (x - text_width // 2, y + node_height/2 + 5),
+                        date_text,
+                        fill="gray",
+                        font=small_font
+                    )
     
     # Save image
     ext = options.format if options.format in ["png", "jpg", "jpeg"] else "png"
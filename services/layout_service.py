@@ -2,6 +2,7 @@
 Layout service for auto-arranging the family tree.
 """
 import logging
+import operator
 from typing import Dict, Any
 
 from models import FamilyTree, LayoutOptions
@@ -9,6 +10,23 @@ from models import FamilyTree, LayoutOptions
 logger = logging.getLogger(__name__)
 
 
+class _LayoutFrame:
+    """One in-progress family unit on the iterative layout stack."""
+
+    __slots__ = ("person_id", "level", "base_x", "spouses", "children",
+                 "next_child", "children_width", "placed_any")
+
+    def __init__(self, person_id, level, base_x, spouses, children):
+        self.person_id = person_id
+        self.level = level
+        self.base_x = base_x
+        self.spouses = spouses
+        self.children = children
+        self.next_child = 0
+        self.children_width = 0.0
+        self.placed_any = False
+
+
 def calculate_layout(tree: FamilyTree, options: LayoutOptions) -> Dict[str, Dict[str, float]]:
     """
     Calculate positions for all persons in the tree starting from root.
@@ -42,97 +60,100 @@ def calculate_layout(tree: FamilyTree, options: LayoutOptions) -> Dict[str, Dict
         marriages_by_person.setdefault(marriage.spouse1_id, []).append(marriage)
         marriages_by_person.setdefault(marriage.spouse2_id, []).append(marriage)
         children_by_marriage[marriage.id] = []
-    
-    for pc in tree.parent_child:
+
+    # Sort each person's marriages by order once at build time instead
+    # of re-sorting on every traversal visit
+    for marriage_list in marriages_by_person.values():
+        marriage_list.sort(key=operator.attrgetter("order"))
+
+    for pc in tree.parent_child.values():
         children_by_parent.setdefault(pc.parent_id, []).append(pc.child_id)
-        if pc.marriage_id and pc.marriage_id in children_by_marriage:
-            if pc.child_id not in children_by_marriage[pc.marriage_id]:
-                children_by_marriage[pc.marriage_id].append(pc.child_id)
-    
-    # Track current position for each level
-    level_positions = {}
+        if pc.marriage_id:
+            children = children_by_marriage.get(pc.marriage_id)
+            if children is not None and pc.child_id not in children:
+                children.append(pc.child_id)
     
-    def get_next_position(level: int) -> float:
-        """Get next available position at a level."""
-        if level not in level_positions:
-            level_positions[level] = 0
-        pos = level_positions[level]
-        level_positions[level] += spacing_x
-        return pos
-    
-    def place_family_unit(person_id: str, level: int, base_x: float) -> float:
-        """Place a person and their family, return the width used."""
-        if person_id in visited:
-            return 0
-        
+    def open_frame(person_id: str, level: int, base_x: float) -> _LayoutFrame:
+        """Mark a person and their spouses visited, collect their children."""
         visited.add(person_id)
-        
-        # Get marriages for this person
-        person_marriages = marriages_by_person.get(person_id, [])
-        
-        # Collect all children from all marriages
-        all_children = []
+
+        # Collect children from all marriages (pre-sorted by order),
+        # deduplicating as we go rather than in a second pass
+        seen = set()
+        children = []
         spouses = []
-        
-        for marriage in sorted(person_marriages, key=lambda m: m.order):
+
+        for marriage in marriages_by_person.get(person_id, ()):
             spouse_id = marriage.spouse2_id if marriage.spouse1_id == person_id else marriage.spouse1_id
             if spouse_id not in visited:
                 spouses.append(spouse_id)
                 visited.add(spouse_id)
-            
-            children = children_by_marriage.get(marriage.id, [])
-            all_children.extend(children)
-        
+
+            for child_id in children_by_marriage.get(marriage.id, ()):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    children.append(child_id)
+
         # Also get children without marriage link
-        direct_children = children_by_parent.get(person_id, [])
-        for child_id in direct_children:
-            if child_id not in all_children:
-                all_children.append(child_id)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_children = []
-        for c in all_children:
-            if c not in seen:
-                seen.add(c)
-                unique_children.append(c)
-        all_children = unique_children
-        
-        # Calculate width needed for children
-        children_width = 0
-        child_positions = []
-        
-        for child_id in all_children:
-            child_x = base_x + children_width
-            child_width = place_family_unit(child_id, level + 1, child_x)
-            if child_width > 0:
-                child_positions.append((child_id, child_x, child_width))
-                children_width += child_width
-        
-        if not child_positions:
-            children_width = spacing_x * (1 + len(spouses))
-        
+        for child_id in children_by_parent.get(person_id, ()):
+            if child_id not in seen:
+                seen.add(child_id)
+                children.append(child_id)
+
+        return _LayoutFrame(person_id, level, base_x, spouses, children)
+
+    def finish_frame(frame: _LayoutFrame) -> float:
+        """Position a completed family unit, return the width it used."""
+        unit_width = spacing_x * (1 + len(frame.spouses))
+        children_width = frame.children_width if frame.placed_any else unit_width
+
         # Calculate center position for this family unit
-        family_x = base_x + children_width / 2 - (spacing_x * (1 + len(spouses))) / 2
-        
+        family_x = frame.base_x + children_width / 2 - unit_width / 2
+        level = frame.level
+
         # Position main person
         if is_horizontal:
-            positions[person_id] = {"x": level * spacing_y, "y": family_x}
+            positions[frame.person_id] = {"x": level * spacing_y, "y": family_x}
         else:
-            positions[person_id] = {"x": family_x, "y": level * spacing_y}
-        
+            positions[frame.person_id] = {"x": family_x, "y": level * spacing_y}
+
         # Position spouses
-        for i, spouse_id in enumerate(spouses):
+        for i, spouse_id in enumerate(frame.spouses):
             spouse_offset = spacing_x * (i + 1)
             if is_horizontal:
                 positions[spouse_id] = {"x": level * spacing_y, "y": family_x + spouse_offset}
             else:
                 positions[spouse_id] = {"x": family_x + spouse_offset, "y": level * spacing_y}
-        
-        return max(children_width, spacing_x * (1 + len(spouses)))
-    
-    # Start layout from root
-    place_family_unit(root_id, 0, 0)
+
+        return max(children_width, unit_width)
+
+    # Iterative post-order traversal from the root: a frame stays on the
+    # stack until every child subtree is placed, so deep trees neither
+    # pay a Python call frame per person nor hit the recursion limit
+    stack = [open_frame(root_id, 0, 0.0)]
+    while stack:
+        frame = stack[-1]
+
+        descended = False
+        while frame.next_child < len(frame.children):
+            child_id = frame.children[frame.next_child]
+            frame.next_child += 1
+            if child_id not in visited:
+                child_x = frame.base_x + frame.children_width
+                stack.append(open_frame(child_id, frame.level + 1, child_x))
+                descended = True
+                break
+        if descended:
+            continue
+
+        # All children placed: position this unit and credit its width
+        # to the parent frame
+        stack.pop()
+        width = finish_frame(frame)
+        if stack:
+            parent = stack[-1]
+            parent.children_width += width
+            parent.placed_any = True
     
     # Handle any unvisited persons (disconnected parts)
     unvisited = [p_id for p_id in tree.persons if p_id not in visited]